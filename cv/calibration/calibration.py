@@ -1,6 +1,10 @@
 import numpy as np
+import argparse
 import cv2
 import glob
+import multiprocessing
+import queue
+import threading
 
 # termination criteria
 subPixCriteria = (
@@ -11,42 +15,90 @@ subPixCriteria = (
 objp = np.zeros((7*5, 3), np.float32)
 objp[:, :2] = np.mgrid[0:7, 0:5].T.reshape(-1, 2)
 
-# Arrays to store object points and image points from all the images.
-objpoints = []  # 3d point in real world space
-imgpoints = []  # 2d points in image plane.
 
-images = glob.glob('calibration-images/*.jpeg')
+def reader(paths, q, flags=cv2.IMREAD_COLOR):
+    # Decode images on a background thread (imread releases the GIL) so the
+    # next image is ready by the time the current one has been processed
+    for path in paths:
+        q.put((path, cv2.imread(path, flags)))
+    q.put(None)
 
-for fname in images:
+
+def find_corners(fname, gray):
+    # Find the refined chess board corners in a single grayscale image.
+    # Returns (object points, image points, image size), or None if the
+    # board was not found.
     print('Processing image ' + fname)
-    img = cv2.imread(fname)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
     # Find the chess board corners
     ret, corners = cv2.findChessboardCorners(gray, (7, 5), None)
 
-    # If found, add object points, image points (after refining them)
-    if ret is True:
-        objpoints.append(objp)
+    # If found, refine the image points
+    if ret is not True:
+        return None
+    cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), subPixCriteria)
+    return objp, corners, gray.shape[::-1]
+
 
-        cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), subPixCriteria)
-        imgpoints.append(corners)
+def process(fname):
+    # decode straight to grayscale, skipping chroma and the color conversion
+    return find_corners(fname, cv2.imread(fname, cv2.IMREAD_GRAYSCALE))
 
-        # Draw and display the corners
-        cv2.drawChessboardCorners(img, (7, 5), corners, ret)
-        img = cv2.resize(img, (0, 0), fx=0.25, fy=0.25)
-        cv2.imshow('image', img)
 
-        cv2.waitKey(500)
+def show_corners(fname, corners):
+    # Draw and display the corners on the full color image
+    img = cv2.imread(fname)
+    cv2.drawChessboardCorners(img, (7, 5), corners, True)
+    img = cv2.resize(img, (0, 0), fx=0.25, fy=0.25)
+    cv2.imshow('image', img)
 
-print('All images processed.')
+    cv2.waitKey(500)
 
-rms, cameraMatrix, distanceCoeffs, rvecs, tvecs = cv2.calibrateCamera(
-    objpoints, imgpoints, gray.shape[::-1], None, None
-)
-print(cameraMatrix)
-print(distanceCoeffs)
-print(rvecs)
-print(tvecs)
 
-cv2.destroyAllWindows()
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--visualize", action="store_true",
+                    help="process images serially and display the corners")
+    args = ap.parse_args()
+
+    images = glob.glob('calibration-images/*.jpeg')
+
+    # Chess board detection is independent per image, so spread it over
+    # every core unless we need to show the results as we go
+    if args.visualize:
+        results = []
+        decoded = queue.Queue(maxsize=4)
+        threading.Thread(target=reader,
+                         args=(images, decoded, cv2.IMREAD_GRAYSCALE),
+                         daemon=True).start()
+        for fname, gray in iter(decoded.get, None):
+            result = find_corners(fname, gray)
+            if result:
+                show_corners(fname, result[1])
+            results.append(result)
+    else:
+        # one OpenCV thread per worker so the pool doesn't oversubscribe
+        # the cores
+        with multiprocessing.Pool(initializer=cv2.setNumThreads,
+                                  initargs=(1,)) as pool:
+            results = pool.map(process, images)
+
+    print('All images processed.')
+
+    # Arrays of object points (3d point in real world space) and image
+    # points (2d points in image plane) from all the images.
+    found = [r for r in results if r]
+    if not found:
+        print('No chess board found in any image, cannot calibrate.')
+        raise SystemExit(1)
+    objpoints, imgpoints, sizes = zip(*found)
+
+    rms, cameraMatrix, distanceCoeffs, rvecs, tvecs = cv2.calibrateCamera(
+        objpoints, imgpoints, sizes[-1], None, None
+    )
+    print(cameraMatrix)
+    print(distanceCoeffs)
+    print(rvecs)
+    print(tvecs)
+
+    cv2.destroyAllWindows()
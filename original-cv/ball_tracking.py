@@ -4,19 +4,108 @@
 
 # import the necessary packages
 from collections import deque
-from imutils.video import VideoStream
 import numpy as np
 import argparse
 import cv2
-import imutils
+import platform
+import queue
+import threading
 import time
 
+
+class LatestFrameStream:
+    """Webcam reader that keeps grab()-ing frames on a background thread and
+    only decodes (retrieve()) a frame when read() asks for one."""
+
+    def __init__(self, src=0):
+        self.stream = cv2.VideoCapture(src)
+        # hold a single frame in the driver queue so we never fall behind
+        self.stream.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.requested = threading.Event()
+        self.frames = queue.Queue()
+        # set once the stream has ended (no camera, or it stopped
+        # delivering frames) or stop() was called
+        self.stopped = not self.stream.isOpened()
+        self.thread = threading.Thread(target=self.update, daemon=True)
+
+    def start(self):
+        if not self.stopped:
+            self.thread.start()
+        return self
+
+    def update(self):
+        # grab() blocks for about a frame period, so nothing read() waits on
+        # is held while it runs; the frame right after a request is decoded
+        # and handed over
+        failures = 0
+        while not self.stopped:
+            ok = self.stream.grab()
+            if ok and self.requested.is_set():
+                self.requested.clear()
+                ok, frame = self.stream.retrieve()
+                if ok:
+                    self.frames.put(frame)
+            if ok:
+                failures = 0
+                continue
+
+            # give up after about a second of failures (e.g. the camera was
+            # unplugged) and wake up any read() waiting for a frame
+            failures += 1
+            if failures >= 10:
+                self.stopped = True
+                self.frames.put(None)
+            else:
+                time.sleep(0.1)
+
+    def read(self):
+        # Returns the next frame, or None if there is none yet or, once
+        # self.stopped is set, at the end of the stream
+        if self.stopped:
+            return None
+        # drop any frame left over from an earlier read() that timed out
+        while not self.frames.empty():
+            self.frames.get_nowait()
+        self.requested.set()
+        try:
+            return self.frames.get(timeout=1.0)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self.stopped = True
+        if self.thread.is_alive():
+            self.thread.join()
+        self.stream.release()
+
+
+def read_video_frame(vs, skip):
+    # grab (without decoding) the frames we are too slow to process and
+    # only retrieve the last one
+    for _ in range(skip):
+        if not vs.grab():
+            return None
+    ok, frame = vs.retrieve()
+    return frame if ok else None
+
+
+# cvtColor/inRange only use their AVX2 code paths on x86 if OpenCV was
+# built to dispatch them (see the top-level README)
+if platform.machine() in ('x86_64', 'AMD64'):
+    cpuFeatures = [line for line in cv2.getBuildInformation().splitlines()
+                   if 'Baseline:' in line
+                   or 'Dispatched code generation:' in line]
+    if 'AVX2' not in ' '.join(cpuFeatures).split():
+        print('Warning: OpenCV was built without AVX2 dispatch')
+
 # construct the argument parse and parse the arguments
 ap = argparse.ArgumentParser()
 ap.add_argument("-v", "--video",
                 help="path to the (optional) video file")
 ap.add_argument("-b", "--buffer", type=int, default=64,
                 help="max buffer size")
+ap.add_argument("-d", "--debug", action="store_true",
+                help="also show the edge/contour detection window")
 args = vars(ap.parse_args())
 
 # define the lower and upper boundaries of the "green"
@@ -26,52 +115,78 @@ greenLower = (29, 86, 6)
 greenUpper = (64, 255, 255)
 pts = deque(maxlen=args["buffer"])
 
+# font for the on-screen distance readouts
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# morphology kernel and mask buffers, reused for every frame
+kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+maskBuf = None
+
+# size of the 600 pixel wide working frame, set from the first frame
+frameSize = None
+
 # if a video path was not supplied, grab the reference
 # to the webcam
 if not args.get("video", False):
-    vs = VideoStream(src=0).start()
+    vs = LatestFrameStream(src=0).start()
 
 # otherwise, grab a reference to the video file
 else:
     vs = cv2.VideoCapture(args["video"])
+    sourceFps = vs.get(cv2.CAP_PROP_FPS) or 30.0
+
+# number of video frames to advance per processed frame
+skip = 1
 
 # allow the camera or video file to warm up
 time.sleep(2.0)
 
 # keep looping
 while True:
-    # grab the current frame
-    frame = vs.read()
+    loopStart = time.time()
 
-    # handle the frame from VideoCapture or VideoStream
-    frame = frame[1] if args.get("video", False) else frame
+    # grab the current frame from the video file or webcam stream
+    if args.get("video", False):
+        frame = read_video_frame(vs, skip)
+    else:
+        frame = vs.read()
+        # the webcam has not delivered a frame yet, try again (unless the
+        # stream has ended)
+        if frame is None and not vs.stopped:
+            continue
 
     # if we are viewing a video and we did not grab a frame,
     # then we have reached the end of the video
     if frame is None:
         break
 
-    font = cv2.FONT_HERSHEY_SIMPLEX
     # resize the frame, blur it, and convert it to the HSV
     # color space
-    frame = imutils.resize(frame, width=600)
+    if frameSize is None:
+        scale = 600.0 / frame.shape[1]
+        frameSize = (600, int(frame.shape[0] * scale))
+    frame = cv2.resize(frame, frameSize, interpolation=cv2.INTER_AREA)
     blurred = cv2.GaussianBlur(frame, (7, 7), 0)
     hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
 
     # cv2.imshow("Blurr Pass",hsv)
     # construct a mask for the color "green", then perform
-    # a series of dilations and erosions to remove any small
-    # blobs left in the mask
-    mask = cv2.inRange(hsv, greenLower, greenUpper)
-    mask = cv2.erode(mask, None, iterations=3)
-    mask = cv2.dilate(mask, None, iterations=3)
+    # a series of erosions and dilations (an opening) to remove
+    # any small blobs left in the mask
+    if maskBuf is None or maskBuf.shape != frame.shape[:2]:
+        maskBuf = np.empty(frame.shape[:2], np.uint8)
+        openBuf = np.empty_like(maskBuf)
+    mask = cv2.inRange(hsv, greenLower, greenUpper, dst=maskBuf)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, dst=openBuf,
+                            iterations=3)
 
     # cv2.imshow("mask", mask)
     # find contours in the mask and initialize the current
-    # (x, y) center of the ball
-    cnts = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL,
-                            cv2.CHAIN_APPROX_SIMPLE)
-    cnts = cnts[0] if imutils.is_cv2() else cnts[1]
+    # (x, y) center of the ball (the mask buffer is rewritten every
+    # frame, so findContours may modify it). The contours are always the
+    # second-to-last return value, in OpenCV 2, 3 and 4.
+    cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL,
+                            cv2.CHAIN_APPROX_SIMPLE)[-2]
     center = None
 
     # find center of the frame, find width, height; then divide them by two to
@@ -83,37 +198,39 @@ while True:
     # draw a filled circle at the center of the frame
     cv2.circle(frame, (centerX, centerY), 5, (0, 0, 255), -1)
 
-    # bilateraly filter the raw frame
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    bilateral_filtered_image = cv2.bilateralFilter(gray, 5, 175, 175)
-    # perform canny edge filter on filtered frame
-    edges = cv2.Canny(bilateral_filtered_image, 50, 200)
-
-    # find contours in edges
-    _, contours, _ = cv2.findContours(edges, cv2.RETR_TREE,
-                                      cv2.CHAIN_APPROX_SIMPLE)
-    contour_list = []
-    for contour in contours:
-        approx = cv2.approxPolyDP(contour, 0.01*cv2.arcLength(contour, True),
-                                  True)
-        area = cv2.contourArea(contour)
-        if ((len(approx) > 8) & (area > 30)):
-            contour_list.append(contour)
-            drawContour = cv2.drawContours(edges, contour_list,  -1, (255, 0,
-                                                                      0), 2)
-            cv2.imshow('Objects Detected', drawContour)
-
-    # process all the contours in cnts
-    for c in cnts:
+    if args["debug"]:
+        # bilateraly filter the raw frame
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        bilateral_filtered_image = cv2.bilateralFilter(gray, 5, 175, 175)
+        # perform canny edge filter on filtered frame
+        edges = cv2.Canny(bilateral_filtered_image, 50, 200)
+
+        # find contours in edges
+        contours = cv2.findContours(edges, cv2.RETR_TREE,
+                                    cv2.CHAIN_APPROX_SIMPLE)[-2]
+        contour_list = []
+        for contour in contours:
+            approx = cv2.approxPolyDP(contour,
+                                      0.01*cv2.arcLength(contour, True), True)
+            area = cv2.contourArea(contour)
+            if ((len(approx) > 8) & (area > 30)):
+                contour_list.append(contour)
+        drawContour = cv2.drawContours(edges, contour_list,  -1, (255, 0, 0),
+                                       2)
+        cv2.imshow('Objects Detected', drawContour)
+
+    focal = (48*12)/2.6
+
+    # only process the maximum contour (really need to find the largest
+    # distance), found with a single scan over the contour areas
+    if len(cnts) > 0:
+        areas = np.fromiter((cv2.contourArea(c) for c in cnts),
+                            dtype=np.float32, count=len(cnts))
+        c = cnts[int(np.argmax(areas))]
 
         ((x, y), radius) = cv2.minEnclosingCircle(c)
         M = cv2.moments(c)
         center = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
-        # find the maximum contour (really need to find the largest distance)
-        maxC = max(cnts, key=cv2.contourArea)
-        M2 = cv2.moments(maxC)
-        maxCenter = (int(M2["m10"] / M2["m00"]), int(M2["m01"] / M2["m00"]))
-        focal = (48*12)/2.6
         # only proceed if the radius meets a minimum size
         if radius > 20:
             # draw the circle and centroid on the frame,
@@ -124,26 +241,22 @@ while True:
             #print(radius)
             # calculate distance to camera using known object dimensions
             distanceCamera = (2.6*focal)/radius
-            distText = str(distanceCamera)
-            distText2 = "distText inches"
-            cv2.putText(frame, str(round(distanceCamera, 1)), (20, 150), font,
+            cv2.putText(frame, f"{distanceCamera:.1f}", (20, 150), FONT,
                         1, (255, 255, 255), 1)
             # Draw a line between the center of frame and detected object
             lineThickness = 1
             cv2.line(frame, (centerX, centerY), (center), (0, 255, 0),
                      lineThickness)
             # print('This is the value of center ',center)
-            (localX, localY) = maxCenter
+            (localX, localY) = center
             distCenter = int(round(((localX-centerX)**2+(localY-centerY)**2)
                                    ** .5))
         # print('this is the Distance from center:',distCenter)
         # write the Distance to Center on image
 
-            cv2.putText(frame, str(distCenter), (20, 100), font, 1, (255, 255,
+            cv2.putText(frame, str(distCenter), (20, 100), FONT, 1, (255, 255,
                                                                      255), 1)
 
-            cv2.GaussianBlur(frame, (11, 11), 0)
-
     # # update the points queue
     # pts.appendleft(center)
     #
@@ -169,6 +282,10 @@ while True:
     if key == ord("q"):
         break
 
+    # skip as many video frames as played back while we were processing
+    if args.get("video", False):
+        skip = max(1, int((time.time() - loopStart) * sourceFps))
+
 # if we are not using a video file, stop the camera video stream
 if not args.get("video", False):
     vs.stop()
@@ -1,26 +1,36 @@
 import cv2
-import imutils
 import numpy as np
 from matplotlib import pyplot as plt
 
 
-def nothing(x):
-    pass
+# set whenever a trackbar moves so the circles are only recomputed on change
+dirty = True
+
+
+def on_change(x):
+    global dirty
+    dirty = True
+
+
+# HoughCircles results for each set of trackbar parameters already tried
+circle_cache = {}
 
 
 img = cv2.imread('court.jpg', 1)
-img = imutils.resize(img, width=1000)
+# resize both copies to 1000 pixels wide, keeping the aspect ratio
+size = (1000, int(img.shape[0] * 1000.0 / img.shape[1]))
+img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
 cv2.namedWindow('image')
 hcircles = cv2.imread('court.jpg', 0)
-hcircles = imutils.resize(hcircles, width=1000)
+hcircles = cv2.resize(hcircles, size, interpolation=cv2.INTER_AREA)
 
 
 gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 bilateral_filtered_image = cv2.bilateralFilter(gray, 5, 175, 175)
 edges = cv2.Canny(bilateral_filtered_image, 25, 100)
 # find contours in edges
-_, contours, _ = cv2.findContours(edges, cv2.RETR_TREE,
-                                  cv2.CHAIN_APPROX_SIMPLE)
+contours = cv2.findContours(edges, cv2.RETR_TREE,
+                            cv2.CHAIN_APPROX_SIMPLE)[-2]
 contour_list = []
 for contour in contours:
     approx = cv2.approxPolyDP(contour, 0.02*cv2.arcLength(contour, True),
@@ -32,42 +42,51 @@ for contour in contours:
                                                                   0), 2)
 
 # use Hough Circles to find balls in imagecv2.createTrackbar('R','image',0,255, nothing)
-cv2.createTrackbar('Min Distance', 'image', 0, 255, nothing)
-cv2.createTrackbar('Param 1', 'image', 0, 255, nothing)
-cv2.createTrackbar('Param 2', 'image', 0, 255, nothing)
-cv2.createTrackbar('Min Radius', 'image', 0, 255, nothing)
-cv2.createTrackbar('Max Radius', 'image', 0, 255, nothing)
+cv2.createTrackbar('Min Distance', 'image', 120, 255, on_change)
+cv2.createTrackbar('Param 1', 'image', 50, 255, on_change)
+cv2.createTrackbar('Param 2', 'image', 60, 255, on_change)
+cv2.createTrackbar('Min Radius', 'image', 0, 255, on_change)
+cv2.createTrackbar('Max Radius', 'image', 0, 255, on_change)
 
 # switch = '0 : OFF \n1 : ON'
-# cv2.createTrackbar(switch, 'img', 0, 1, nothing)
+# cv2.createTrackbar(switch, 'img', 0, 1, on_change)
 
 
 while(1):
 
-    cv2.imshow('detected circles', img)
-
-    # mindistance = cv2.getTrackbarPos('Min Distance', 'image')
-    # param1 = cv2.getTrackbarPos('Param 1', 'image')
-    # param2 = cv2.getTrackbarPos('Param 2', 'image')
-    # minRadius = cv2.getTrackbarPos('Min Radius', 'image')
-    # maxRadius = cv2.getTrackbarPos('Max Radius', 'image')
-    # # s = cv2.getTrackbarPos(switch, 'img')
-    # # if s == 0:
-    # #    img[:] = 0
-    # # else:
-    # #    img[:] = [mindistance, param1, param2, minRadius, maxRadius]
-    #
-    # # gray = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-    # circles = cv2.HoughCircles(hcircles, cv2.HOUGH_GRADIENT, 2, 120,
-    #                            param1=50, param2=60, minRadius=0, maxRadius=0)
-    # circles = np.uint16(np.around(circles))
-    # for i in circles[0, :]:
-    #     # draw the outer circle
-    #     cv2.circle(img, (i[0], i[1]), i[2], (0, 255, 0), 2)
-    #     # draw the center of the circle
-    #     cv2.circle(img, (i[0], i[1]), 2, (0, 0, 255), 3)
-
-    cv2.imshow("img", edges)
+    # only rerun HoughCircles when a trackbar has moved
+    if dirty:
+        dirty = False
+        # HoughCircles needs a positive distance and thresholds
+        mindistance = max(1, cv2.getTrackbarPos('Min Distance', 'image'))
+        param1 = max(1, cv2.getTrackbarPos('Param 1', 'image'))
+        param2 = max(1, cv2.getTrackbarPos('Param 2', 'image'))
+        minRadius = cv2.getTrackbarPos('Min Radius', 'image')
+        maxRadius = cv2.getTrackbarPos('Max Radius', 'image')
+
+        params = (mindistance, param1, param2, minRadius, maxRadius)
+        if params not in circle_cache:
+            circles = cv2.HoughCircles(hcircles, cv2.HOUGH_GRADIENT, 2,
+                                       mindistance, param1=param1,
+                                       param2=param2, minRadius=minRadius,
+                                       maxRadius=maxRadius)
+            if circles is None:
+                circles = np.empty((1, 0, 3), np.float32)
+            # round in place, then convert once for drawing
+            circle_cache[params] = np.rint(circles[0], out=circles[0]).astype(
+                np.int32
+            )
+        circles = circle_cache[params]
+
+        detected = img.copy()
+        for x, y, r in circles.tolist():
+            # draw the outer circle
+            cv2.circle(detected, (x, y), r, (0, 255, 0), 2)
+            # draw the center of the circle
+            cv2.circle(detected, (x, y), 2, (0, 0, 255), 3)
+
+        cv2.imshow('detected circles', detected)
+        cv2.imshow("img", edges)
 # plt.subplot(121), plt.imshow(img, cmap='gray')
 # plt.title('Original Image'), plt.xticks([]), plt.yticks([])
 # plt.subplot(122), plt.imshow(edges, cmap='gray')
@@ -75,6 +94,7 @@ while(1):
 #
 # plt.show()
 
-    k = cv2.waitKey(0)
+    k = cv2.waitKey(30)
     if k == 27:
         cv2.destroyAllWindows()
+        break